@@ -11,170 +11,22 @@ import random
 import math
 import json
 import os
+import argparse
+import time
+
+from simulation import Simulation
+import netplay
 
 # Game Constants
 SAVE_FILE = "zombie_monkeys.json"
-
-class Powerup:
-    def __init__(self, x, y, type):
-        self.x = x
-        self.y = y
-        self.type = type  # 'health', 'ammo', 'speed', 'damage'
-        self.alive = True
-        self.lifetime = 15.0
-        
-    def update(self, dt):
-        self.lifetime -= dt
-        if self.lifetime <= 0:
-            self.alive = False
-
-class Bullet:
-    def __init__(self, x, y, angle, damage=10):
-        self.x = x
-        self.y = y
-        self.angle = angle
-        self.speed = 500
-        self.damage = damage
-        self.alive = True
-        
-    def update(self, dt):
-        self.x += math.cos(self.angle) * self.speed * dt
-        self.y += math.sin(self.angle) * self.speed * dt
-        
-        if self.x < 0 or self.x > 800 or self.y < 0 or self.y > 600:
-            self.alive = False
-
-class Monkey:
-    def __init__(self, spawn_x, spawn_y, wave_num, monkey_type='normal'):
-        self.x = spawn_x
-        self.y = spawn_y
-        self.type = monkey_type
-        
-        # Different monkey types
-        if monkey_type == 'fast':
-            self.health = 20 + (wave_num * 5)
-            self.speed = 100 + (wave_num * 8)
-            self.damage = 3 + wave_num
-            self.size = 15
-            self.color = (0.8, 0.3, 0.3)
-        elif monkey_type == 'tank':
-            self.health = 60 + (wave_num * 20)
-            self.speed = 30 + (wave_num * 2)
-            self.damage = 10 + (wave_num * 2)
-            self.size = 30
-            self.color = (0.2, 0.6, 0.2)
-        else:  # normal
-            self.health = 30 + (wave_num * 10)
-            self.speed = 50 + (wave_num * 5)
-            self.damage = 5 + wave_num
-            self.size = 20
-            self.color = (0.3, 0.5, 0.2)
-        
-        self.max_health = self.health
-        self.alive = True
-        self.attack_cooldown = 0
-        self.animation_frame = 0
-        
-    def move_towards_player(self, player_x, player_y, dt):
-        dx = player_x - self.x
-        dy = player_y - self.y
-        dist = math.sqrt(dx*dx + dy*dy)
-        
-        if dist > 35:
-            self.x += (dx / dist) * self.speed * dt
-            self.y += (dy / dist) * self.speed * dt
-        elif self.attack_cooldown <= 0:
-            self.attack_cooldown = 1.0
-            return True
-        
-        self.attack_cooldown -= dt
-        self.animation_frame = (self.animation_frame + dt * 10) % 4
-        return False
-    
-    def take_damage(self, damage):
-        self.health -= damage
-        if self.health <= 0:
-            self.alive = False
-            return True
-        return False
-
-class Player:
-    def __init__(self):
-        self.x = 400
-        self.y = 300
-        self.health = 100
-        self.max_health = 100
-        self.speed = 180
-        self.angle = 0
-        self.points = 0
-        self.kills = 0
-        self.ammo = 30
-        self.max_ammo = 30
-        self.reload_time = 0
-        self.fire_cooldown = 0
-        self.damage = 10
-        self.speed_boost = 1.0
-        self.speed_boost_time = 0
-        self.damage_boost = 1.0
-        self.damage_boost_time = 0
-        
-    def shoot(self):
-        if self.ammo > 0 and self.fire_cooldown <= 0:
-            self.ammo -= 1
-            self.fire_cooldown = 0.15
-            return Bullet(self.x, self.y, self.angle, self.damage * self.damage_boost)
-        return None
-    
-    def reload(self):
-        if self.reload_time <= 0 and self.ammo < self.max_ammo:
-            self.reload_time = 2.0
-    
-    def pickup_powerup(self, powerup):
-        if powerup.type == 'health':
-            self.health = min(self.max_health, self.health + 30)
-        elif powerup.type == 'ammo':
-            self.ammo = self.max_ammo
-        elif powerup.type == 'speed':
-            self.speed_boost = 1.5
-            self.speed_boost_time = 10.0
-        elif powerup.type == 'damage':
-            self.damage_boost = 2.0
-            self.damage_boost_time = 10.0
-    
-    def update(self, dt):
-        if self.reload_time > 0:
-            self.reload_time -= dt
-            if self.reload_time <= 0:
-                self.ammo = self.max_ammo
-        
-        if self.fire_cooldown > 0:
-            self.fire_cooldown -= dt
-        
-        if self.speed_boost_time > 0:
-            self.speed_boost_time -= dt
-            if self.speed_boost_time <= 0:
-                self.speed_boost = 1.0
-        
-        if self.damage_boost_time > 0:
-            self.damage_boost_time -= dt
-            if self.damage_boost_time <= 0:
-                self.damage_boost = 1.0
+PLAYER_COLORS = [(0.2, 0.4, 0.9), (0.9, 0.6, 0.1), (0.7, 0.3, 0.9), (0.1, 0.8, 0.7)]
 
 class GameWidget(Widget):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         
-        self.player = Player()
-        self.monkeys = []
-        self.bullets = []
-        self.powerups = []
-        self.wave = 1
-        self.wave_active = False
-        self.monkeys_to_spawn = 0
-        self.spawn_timer = 0
-        self.game_over = False
+        self.world = self.create_world()
         self.paused = False
-        self.powerup_spawn_timer = 0
         
         self.touch_start = None
         self.is_shooting = False
@@ -227,108 +79,46 @@ class GameWidget(Widget):
             y = random.randint(0, 600)
             Ellipse(pos=(x, y), size=(random.randint(30, 60), random.randint(20, 40)))
     
+    def create_world(self):
+        world = Simulation()
+        self.slot = world.add_player().slot
+        return world
+    
+    @property
+    def player(self):
+        return self.world.players.get(self.slot)
+    
     def start_wave(self):
-        self.wave_active = True
-        self.monkeys_to_spawn = 5 + (self.wave * 4)
-        
-        # Add special monkeys in later waves
-        if self.wave >= 3:
-            self.monkeys_to_spawn += 2  # Add fast monkeys
-        if self.wave >= 5:
-            self.monkeys_to_spawn += 1  # Add tank monkeys
-        
-        self.spawn_timer = 0
-    
-    def spawn_monkey(self):
-        side = random.randint(0, 3)
-        if side == 0:
-            x, y = random.randint(0, 800), 600
-        elif side == 1:
-            x, y = random.randint(0, 800), 0
-        elif side == 2:
-            x, y = 0, random.randint(0, 600)
-        else:
-            x, y = 800, random.randint(0, 600)
-        
-        # Spawn special monkeys based on wave
-        monkey_type = 'normal'
-        if self.wave >= 5 and random.random() < 0.15:
-            monkey_type = 'tank'
-        elif self.wave >= 3 and random.random() < 0.25:
-            monkey_type = 'fast'
-        
-        self.monkeys.append(Monkey(x, y, self.wave, monkey_type))
-        self.monkeys_to_spawn -= 1
+        if not self.world.wave_active:
+            self.world.start_wave()
+    
+    def shoot(self):
+        if self.player is None:
+            return
+        self.world.fire(self.player)
+    
+    def reload(self):
+        if self.player is None:
+            return
+        self.player.reload()
+    
+    def nudge(self, dx, dy):
+        if self.player is None:
+            return
+        self.player.x = max(20, min(780, self.player.x + dx))
+        self.player.y = max(20, min(580, self.player.y + dy))
+    
+    def status_text(self):
+        return ''
     
-    def spawn_powerup(self):
-        x = random.randint(100, 700)
-        y = random.randint(100, 500)
-        powerup_type = random.choice(['health', 'ammo', 'speed', 'damage'])
-        self.powerups.append(Powerup(x, y, powerup_type))
+    def close(self):
+        pass
     
     def update(self, dt):
-        if self.game_over or self.paused:
+        if self.world.game_over or self.paused:
             return
         
-        self.player.update(dt)
-        
-        # Powerup spawning
-        self.powerup_spawn_timer += dt
-        if self.powerup_spawn_timer > 15.0 and len(self.powerups) < 3:
-            self.spawn_powerup()
-            self.powerup_spawn_timer = 0
-        
-        # Update powerups
-        for powerup in self.powerups[:]:
-            powerup.update(dt)
-            if not powerup.alive:
-                self.powerups.remove(powerup)
-            else:
-                # Check pickup
-                dist = math.sqrt((powerup.x - self.player.x)**2 + (powerup.y - self.player.y)**2)
-                if dist < 25:
-                    self.player.pickup_powerup(powerup)
-                    self.powerups.remove(powerup)
-        
-        # Wave spawning
-        if self.wave_active and self.monkeys_to_spawn > 0:
-            self.spawn_timer += dt
-            spawn_rate = max(0.5, 1.5 - (self.wave * 0.1))
-            if self.spawn_timer > spawn_rate:
-                self.spawn_monkey()
-                self.spawn_timer = 0
-        
-        # Check wave complete
-        if self.wave_active and self.monkeys_to_spawn == 0 and len(self.monkeys) == 0:
-            self.wave_active = False
-            self.wave += 1
-            self.player.points += 200 * self.wave
-            self.player.health = min(self.player.max_health, self.player.health + 20)
-        
-        # Update monkeys
-        for monkey in self.monkeys[:]:
-            if monkey.move_towards_player(self.player.x, self.player.y, dt):
-                self.player.health -= monkey.damage
-                if self.player.health <= 0:
-                    self.game_over = True
-        
-        # Update bullets
-        for bullet in self.bullets[:]:
-            bullet.update(dt)
-            if not bullet.alive:
-                self.bullets.remove(bullet)
-                continue
-            
-            for monkey in self.monkeys[:]:
-                dist = math.sqrt((bullet.x - monkey.x)**2 + (bullet.y - monkey.y)**2)
-                if dist < monkey.size:
-                    if monkey.take_damage(bullet.damage):
-                        points = 10 if monkey.type == 'normal' else 20 if monkey.type == 'fast' else 30
-                        self.player.points += points * self.wave
-                        self.player.kills += 1
-                        self.monkeys.remove(monkey)
-                    bullet.alive = False
-                    break
+        self.world.update(dt)
         
         self.canvas.clear()
         self.draw_game()
@@ -366,7 +156,7 @@ class GameWidget(Widget):
                              size=(obs['w'], obs['h']))
             
             # Draw powerups
-            for powerup in self.powerups:
+            for powerup in self.world.powerups:
                 # Pulsing effect
                 pulse = 1 + math.sin(Clock.get_time() * 5) * 0.2
                 size = 20 * pulse
@@ -393,11 +183,11 @@ class GameWidget(Widget):
             
             # Draw bullets
             Color(1, 1, 0)
-            for bullet in self.bullets:
+            for bullet in self.world.bullets:
                 Ellipse(pos=(bullet.x-4, bullet.y-4), size=(8, 8))
             
             # Draw monkeys
-            for monkey in self.monkeys:
+            for monkey in self.world.monkeys:
                 Color(*monkey.color)
                 Ellipse(pos=(monkey.x-monkey.size, monkey.y-monkey.size), 
                        size=(monkey.size*2, monkey.size*2))
@@ -427,26 +217,39 @@ class GameWidget(Widget):
                 Rectangle(pos=(monkey.x-bar_width//2, monkey.y+monkey.size+5), 
                          size=(bar_width * (monkey.health/monkey.max_health), 4))
             
-            # Draw player
-            if self.player.speed_boost > 1.0:
-                Color(0, 0.8, 1, 0.5)
-                Ellipse(pos=(self.player.x-20, self.player.y-20), size=(40, 40))
-            
-            if self.player.damage_boost > 1.0:
-                Color(1, 0.3, 0, 0.5)
-                Ellipse(pos=(self.player.x-20, self.player.y-20), size=(40, 40))
-            
-            Color(0.2, 0.4, 0.9)
-            Ellipse(pos=(self.player.x-15, self.player.y-15), size=(30, 30))
-            
-            # Gun
-            Color(0.5, 0.5, 0.5)
-            gun_end_x = self.player.x + math.cos(self.player.angle) * 25
-            gun_end_y = self.player.y + math.sin(self.player.angle) * 25
-            Line(points=[self.player.x, self.player.y, gun_end_x, gun_end_y], width=4)
+            # Draw players
+            for player in self.world.players.values():
+                if not player.alive:
+                    Color(0.4, 0.4, 0.4, 0.6)
+                    Ellipse(pos=(player.x-15, player.y-15), size=(30, 30))
+                    continue
+                
+                if player.speed_boost > 1.0:
+                    Color(0, 0.8, 1, 0.5)
+                    Ellipse(pos=(player.x-20, player.y-20), size=(40, 40))
+                
+                if player.damage_boost > 1.0:
+                    Color(1, 0.3, 0, 0.5)
+                    Ellipse(pos=(player.x-20, player.y-20), size=(40, 40))
+                
+                Color(*PLAYER_COLORS[player.slot % len(PLAYER_COLORS)])
+                Ellipse(pos=(player.x-15, player.y-15), size=(30, 30))
+                
+                # Gun
+                Color(0.5, 0.5, 0.5)
+                gun_end_x = player.x + math.cos(player.angle) * 25
+                gun_end_y = player.y + math.sin(player.angle) * 25
+                Line(points=[player.x, player.y, gun_end_x, gun_end_y], width=4)
+    
+    def aim(self, angle):
+        self.player.angle = angle
+    
+    def steer(self, dir_x, dir_y):
+        if dir_x or dir_y:
+            self.player.move(dir_x, dir_y, 1/60)
     
     def on_touch_down(self, touch):
-        if self.game_over:
+        if self.world.game_over or self.player is None:
             return
         self.touch_start = touch.pos
         self.is_shooting = True
@@ -455,34 +258,118 @@ class GameWidget(Widget):
     def on_touch_move(self, touch):
         if not self.touch_start:
             return
+        if self.player is None:
+            # Dropped by the server while the finger was down
+            self.touch_start = None
+            return
         
         dx = touch.x - self.player.x
         dy = touch.y - self.player.y
-        self.player.angle = math.atan2(dy, dx)
+        self.aim(math.atan2(dy, dx))
         
-        if self.touch_start:
-            move_dx = touch.x - self.touch_start[0]
-            move_dy = touch.y - self.touch_start[1]
-            dist = math.sqrt(move_dx**2 + move_dy**2)
-            
-            if dist > 20:
-                self.player.x += (move_dx / dist) * self.player.speed * self.player.speed_boost * (1/60)
-                self.player.y += (move_dy / dist) * self.player.speed * self.player.speed_boost * (1/60)
-                
-                self.player.x = max(20, min(780, self.player.x))
-                self.player.y = max(20, min(580, self.player.y))
+        move_dx = touch.x - self.touch_start[0]
+        move_dy = touch.y - self.touch_start[1]
+        dist = math.sqrt(move_dx**2 + move_dy**2)
+        
+        if dist > 20:
+            self.steer(move_dx / dist, move_dy / dist)
+        else:
+            self.steer(0, 0)
     
     def on_touch_up(self, touch):
         self.touch_start = None
         self.is_shooting = False
+        self.steer(0, 0)
+
+class NetGameWidget(GameWidget):
+    # Thin co-op client: the server runs the game, this widget only sends
+    # input and draws the interpolated snapshots
+    def __init__(self, server, **kwargs):
+        self.client = netplay.SocketClient(*server)
+        self.send_timer = 0
+        self.nudge_time = 0
+        self.steered = False
+        super().__init__(**kwargs)
+    
+    def create_world(self):
+        return self.client.world
+    
+    @property
+    def player(self):
+        if self.client.slot is None:
+            return None
+        return self.world.players.get(self.client.slot)
+    
+    def start_wave(self):
+        self.client.press_start()
+    
+    def shoot(self):
+        self.client.press_fire()
+    
+    def reload(self):
+        self.client.press_reload()
+    
+    def nudge(self, dx, dy):
+        # Keys move in short bursts, roughly the local 15px per press
+        self.client.move = (dx / 15, dy / 15)
+        self.nudge_time = 1/12
+    
+    def aim(self, angle):
+        self.client.angle = angle
+    
+    def steer(self, dir_x, dir_y):
+        self.client.move = (dir_x, dir_y)
+        self.steered = True
+        self.nudge_time = 0
+    
+    def status_text(self):
+        if self.client.full:
+            return '[b]SERVER FULL[/b]'
+        if self.player is None:
+            if self.client.reconnecting:
+                return 'Reconnecting...'
+            return f'Connecting to {self.client.sock.getpeername()[0]}...'
+        return ''
+    
+    def close(self):
+        self.client.close()
+    
+    def update(self, dt):
+        now = time.monotonic()
+        self.client.poll(now)
+        
+        if self.nudge_time > 0:
+            self.nudge_time -= dt
+            if self.nudge_time <= 0:
+                self.client.move = (0, 0)
+        
+        self.send_timer += dt
+        if self.send_timer >= 1 / self.world.tick_rate:
+            # Like the local game, a held drag only walks while it moves
+            if not self.steered and self.nudge_time <= 0:
+                self.client.move = (0, 0)
+            self.steered = False
+            self.send_timer = 0
+            self.client.send_input()
+        
+        self.world.interpolate(now)
+        self.canvas.clear()
+        self.draw_game()
 
 class ZombieMonkeysApp(App):
+    def __init__(self, server=None, **kwargs):
+        super().__init__(**kwargs)
+        self.server = server
+    
     def build(self):
         Window.size = (800, 600)
         Window.clearcolor = (0.08, 0.08, 0.08, 1)
         
         self.layout = FloatLayout()
-        self.game = GameWidget(size=(800, 600))
+        if self.server:
+            self.game = NetGameWidget(self.server, size=(800, 600))
+        else:
+            self.game = GameWidget(size=(800, 600))
         self.layout.add_widget(self.game)
         
         # HUD
@@ -561,7 +448,7 @@ class ZombieMonkeysApp(App):
             background_color=(0.3, 0.3, 0.8, 1),
             font_size='18sp'
         )
-        reload_btn.bind(on_press=lambda x: self.game.player.reload())
+        reload_btn.bind(on_press=lambda x: self.game.reload())
         self.layout.add_widget(reload_btn)
         
         self.shoot_btn = Button(
@@ -591,35 +478,39 @@ class ZombieMonkeysApp(App):
         return self.layout
     
     def shoot(self, *args):
-        bullet = self.game.player.shoot()
-        if bullet:
-            self.game.bullets.append(bullet)
+        self.game.shoot()
     
     def on_keyboard_down(self, window, key, scancode, codepoint, modifier):
         if key == 32:
             self.shoot()
         elif key == 114:
-            self.game.player.reload()
+            self.game.reload()
         elif key == 119:
-            self.game.player.y = min(580, self.game.player.y + 15)
+            self.game.nudge(0, 15)
         elif key == 115:
-            self.game.player.y = max(20, self.game.player.y - 15)
+            self.game.nudge(0, -15)
         elif key == 97:
-            self.game.player.x = max(20, self.game.player.x - 15)
+            self.game.nudge(-15, 0)
         elif key == 100:
-            self.game.player.x = min(780, self.game.player.x + 15)
+            self.game.nudge(15, 0)
     
     def start_wave(self, *args):
-        if not self.game.wave_active:
+        if not self.game.world.wave_active:
             self.game.start_wave()
             self.start_btn.opacity = 0
             self.start_btn.disabled = True
     
     def update_hud(self, dt):
-        self.wave_label.text = f'[b]WAVE {self.game.wave}[/b]'
-        self.health_label.text = f'HP: {int(self.game.player.health)}/{self.game.player.max_health}'
+        world = self.game.world
+        player = self.game.player
+        if player is None:
+            self.game_over_label.text = self.game.status_text()
+            return
         
-        health_pct = self.game.player.health / self.game.player.max_health
+        self.wave_label.text = f'[b]WAVE {world.wave}[/b]'
+        self.health_label.text = f'HP: {int(player.health)}/{player.max_health}'
+        
+        health_pct = player.health / player.max_health
         if health_pct > 0.5:
             self.health_label.color = (0, 1, 0, 1)
         elif health_pct > 0.25:
@@ -627,26 +518,45 @@ class ZombieMonkeysApp(App):
         else:
             self.health_label.color = (1, 0, 0, 1)
         
-        self.ammo_label.text = f'AMMO: {self.game.player.ammo}/{self.game.player.max_ammo}'
-        self.points_label.text = f'POINTS: {self.game.player.points}'
-        self.kills_label.text = f'KILLS: {self.game.player.kills}'
-        self.monkeys_label.text = f'MONKEYS: {len(self.game.monkeys)}'
+        self.ammo_label.text = f'AMMO: {player.ammo}/{player.max_ammo}'
+        self.points_label.text = f'POINTS: {player.points}'
+        self.kills_label.text = f'KILLS: {player.kills}'
+        self.monkeys_label.text = f'MONKEYS: {len(world.monkeys)}'
         
-        if self.game.player.reload_time > 0:
-            self.ammo_label.text = f'RELOADING... {self.game.player.reload_time:.1f}s'
+        if player.reload_time > 0:
+            self.ammo_label.text = f'RELOADING... {player.reload_time:.1f}s'
             self.ammo_label.color = (1, 0.5, 0, 1)
         else:
             self.ammo_label.color = (1, 1, 0, 1)
         
-        if not self.game.wave_active and not self.game.game_over and len(self.game.monkeys) == 0:
+        if not world.wave_active and not world.game_over and len(world.monkeys) == 0:
             self.start_btn.opacity = 1
             self.start_btn.disabled = False
+        elif world.wave_active:
+            self.start_btn.opacity = 0
+            self.start_btn.disabled = True
         
-        if self.game.game_over:
+        if world.game_over:
             self.game_over_label.text = (f'[b][color=ff0000]GAME OVER![/color][/b]\n\n'
-                                        f'Wave: {self.game.wave}\n'
-                                        f'Kills: {self.game.player.kills}\n'
-                                        f'Points: {self.game.player.points}')
+                                        f'Wave: {world.wave}\n'
+                                        f'Kills: {player.kills}\n'
+                                        f'Points: {player.points}')
+        else:
+            self.game_over_label.text = self.game.status_text()
+    
+    def on_stop(self):
+        self.game.close()
 
 if __name__ == '__main__':
-    ZombieMonkeysApp().run()
+    # Kivy consumes its own options, game options go after "--":
+    #   python main.py -- --connect 127.0.0.1:47800
+    parser = argparse.ArgumentParser(description='Zombie Monkeys')
+    parser.add_argument('--connect', metavar='HOST[:PORT]',
+                        help='join a co-op server started with "python netplay.py server"')
+    args = parser.parse_args()
+    
+    server = None
+    if args.connect:
+        host, _, port = args.connect.partition(':')
+        server = (host, int(port or netplay.DEFAULT_PORT))
+    ZombieMonkeysApp(server=server).run()
@@ -0,0 +1,868 @@
+"""Co-op networking for Zombie Monkeys.
+
+One headless process owns the Simulation and runs it at a fixed tick rate.
+Every tick it sends each client a snapshot that only contains what changed
+since the last snapshot that client acknowledged (quantized fields, packed
+with struct).  Clients just send their input and interpolate between
+snapshots, see NetGameWidget in main.py.
+
+    python netplay.py server [--host 0.0.0.0] [--port 47800]
+    python main.py -- --connect 127.0.0.1:47800         # desktop only for now
+    python netplay.py bots --players 3                  # fake players
+    python netplay.py bench --players 4 --monkeys 50,200,800
+
+The server logs tick time and bytes per tick every few seconds.  "bench" runs
+a server plus bots on localhost and prints the same numbers for each monkey
+count, which shows how much one core can handle.
+
+Snapshots are not split into several datagrams, so bandwidth runs out before
+CPU does.  Packets above MTU (1200 B, roughly 90 monkeys in a full snapshot)
+get IP-fragmented off localhost and any lost fragment loses the snapshot.
+A full snapshot, which every joining client needs, passes the UDP limit of
+65507 B at roughly 5400 monkeys and can't be sent at all.  Both counts are in
+the stats line next to the tick time.
+"""
+import argparse
+import asyncio
+import bisect
+import logging
+import math
+import random
+import socket
+import struct
+import time
+from collections import namedtuple
+
+from simulation import Simulation, Player, Monkey, Bullet, Powerup, MAX_PLAYERS
+
+DEFAULT_PORT = 47800
+TICK_RATE = 30
+HISTORY = 64  # snapshots kept on both ends to delta against
+INTERP_TICKS = 2  # how far clients render behind the newest snapshot
+CLIENT_TIMEOUT = 5.0
+JOIN_RETRY = 0.5
+MTU = 1200  # safe UDP payload on real networks
+MAX_DATAGRAM = 65507
+
+MSG_JOIN = 1
+MSG_WELCOME = 2
+MSG_FULL = 3
+MSG_INPUT = 4
+MSG_SNAPSHOT = 5
+MSG_LEAVE = 6
+MSG_NOT_JOINED = 7
+
+# type, last input sequence sent before joining
+JOIN = struct.Struct('<BH')
+# type, slot, tick rate
+WELCOME = struct.Struct('<BBB')
+# type, input sequence, acked tick, move x, move y, aim,
+# fire/reload/start-wave press counters
+INPUT = struct.Struct('<BHIbbHBBB')
+# type, tick, baseline tick (0 = full snapshot)
+SNAPSHOT = struct.Struct('<BII')
+COUNT = struct.Struct('<H')
+
+log = logging.getLogger('netplay')
+
+Field = namedtuple('Field', 'attr code scale choices smooth')
+
+def field(attr, code, scale=1, choices=None, smooth=None):
+    return Field(attr, code, scale, choices, smooth)
+
+LIMITS = {'B': (0, 255), 'b': (-128, 127), 'H': (0, 65535),
+          'h': (-32768, 32767), 'I': (0, 4294967295)}
+ANGLE_SCALE = 65536 / (2 * math.pi)
+
+class Schema:
+    # Wire layout for one kind of entity.  An entity is captured as a tuple
+    # of quantized ints; a delta entry is the entity id, a bitmask of the
+    # fields that differ from the baseline and then only those fields.
+    def __init__(self, fields):
+        self.fields = fields
+        self.full_mask = (1 << len(fields)) - 1
+        self.mask_code = 'B' if len(fields) <= 8 else 'H'
+        self.head = struct.Struct('<H' + self.mask_code)
+        self.bodies = {}
+        self.enums = [(i, len(f.choices)) for i, f in enumerate(fields) if f.choices]
+
+    def body(self, mask):
+        body = self.bodies.get(mask)
+        if body is None:
+            codes = ''.join(f.code for i, f in enumerate(self.fields) if mask >> i & 1)
+            body = struct.Struct('<' + codes)
+            self.bodies[mask] = body
+        return body
+
+    def capture(self, entity):
+        values = []
+        for f in self.fields:
+            value = getattr(entity, f.attr)
+            if f.choices:
+                values.append(f.choices.index(value))
+                continue
+            if f.smooth == 'angle':
+                value %= 2 * math.pi
+            low, high = LIMITS[f.code]
+            values.append(max(low, min(high, int(round(value * f.scale)))))
+        return tuple(values)
+
+    def decode(self, values):
+        decoded = []
+        for f, value in zip(self.fields, values):
+            if f.choices:
+                decoded.append(f.choices[value])
+            elif f.scale == 1:
+                decoded.append(value)
+            else:
+                decoded.append(value / f.scale)
+        return decoded
+
+    def apply(self, entity, values):
+        for f, value in zip(self.fields, self.decode(values)):
+            setattr(entity, f.attr, value)
+
+    def write(self, out, base, current):
+        removed = [i for i in base if i not in current]
+        out += COUNT.pack(len(removed))
+        if removed:
+            out += struct.pack('<%dH' % len(removed), *removed)
+
+        count_at = len(out)
+        out += COUNT.pack(0)
+        changed = 0
+        for entity_id, values in current.items():
+            old = base.get(entity_id)
+            if old is None:
+                mask = self.full_mask
+                fields = values
+            elif old == values:
+                continue
+            else:
+                mask = 0
+                fields = []
+                for i, (a, b) in enumerate(zip(old, values)):
+                    if a != b:
+                        mask |= 1 << i
+                        fields.append(b)
+            out += self.head.pack(entity_id, mask)
+            out += self.body(mask).pack(*fields)
+            changed += 1
+        COUNT.pack_into(out, count_at, changed)
+
+    def read(self, data, offset, base):
+        current = dict(base)
+        (removed,) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        for entity_id in struct.unpack_from('<%dH' % removed, data, offset):
+            current.pop(entity_id, None)
+        offset += removed * 2
+
+        (changed,) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        for _ in range(changed):
+            entity_id, mask = self.head.unpack_from(data, offset)
+            offset += self.head.size
+            body = self.body(mask)
+            fields = body.unpack_from(data, offset)
+            offset += body.size
+            old = current.get(entity_id)
+            if mask == self.full_mask or old is None:
+                current[entity_id] = fields
+            else:
+                values = list(old)
+                fields = iter(fields)
+                for i in range(len(values)):
+                    if mask >> i & 1:
+                        values[i] = next(fields)
+                current[entity_id] = tuple(values)
+            for i, count in self.enums:
+                if current[entity_id][i] >= count:
+                    raise IndexError('bad choice %d for %s' % (current[entity_id][i], self.fields[i].attr))
+        return current, offset
+
+# Positions are sent in 1/8 pixel steps, which fits the 800x600 map in uint16
+WORLD = Schema((
+    field('wave', 'H'),
+    field('wave_active', 'B'),
+    field('monkeys_to_spawn', 'H'),
+    field('game_over', 'B'),
+))
+PLAYER = Schema((
+    field('x', 'H', 8, smooth='linear'),
+    field('y', 'H', 8, smooth='linear'),
+    field('angle', 'H', ANGLE_SCALE, smooth='angle'),
+    field('health', 'h'),
+    field('alive', 'B'),
+    field('ammo', 'B'),
+    field('points', 'I'),
+    field('kills', 'I'),
+    field('reload_time', 'B', 10),
+    field('speed_boost', 'B', 10),
+    field('damage_boost', 'B', 10),
+))
+MONKEY = Schema((
+    field('type', 'B', choices=('normal', 'fast', 'tank')),
+    field('x', 'H', 8, smooth='linear'),
+    field('y', 'H', 8, smooth='linear'),
+    field('health', 'h'),
+    field('max_health', 'H'),
+))
+BULLET = Schema((
+    field('x', 'H', 8, smooth='linear'),
+    field('y', 'H', 8, smooth='linear'),
+))
+POWERUP = Schema((
+    field('type', 'B', choices=('health', 'ammo', 'speed', 'damage')),
+    field('x', 'H', 8),
+    field('y', 'H', 8),
+))
+KINDS = (WORLD, PLAYER, MONKEY, BULLET, POWERUP)
+EMPTY = ({}, {}, {}, {}, {})
+
+def capture(sim):
+    return (
+        {0: WORLD.capture(sim)},
+        {slot: PLAYER.capture(p) for slot, p in sim.players.items()},
+        {m.id: MONKEY.capture(m) for m in sim.monkeys},
+        {b.id: BULLET.capture(b) for b in sim.bullets},
+        {p.id: POWERUP.capture(p) for p in sim.powerups},
+    )
+
+def encode_snapshot(tick, base_tick, base, state):
+    out = bytearray(SNAPSHOT.pack(MSG_SNAPSHOT, tick, base_tick))
+    for schema, old, new in zip(KINDS, base, state):
+        schema.write(out, old, new)
+    return bytes(out)
+
+def decode_snapshot(data, baselines):
+    # Returns (tick, state), or None when the baseline is no longer known
+    # or the packet is truncated or corrupt
+    if len(data) < SNAPSHOT.size:
+        return None
+    _, tick, base_tick = SNAPSHOT.unpack_from(data)
+    if base_tick:
+        base = baselines.get(base_tick)
+        if base is None:
+            return None
+    else:
+        base = EMPTY
+    offset = SNAPSHOT.size
+    state = []
+    try:
+        for schema, old in zip(KINDS, base):
+            current, offset = schema.read(data, offset, old)
+            state.append(current)
+    except (struct.error, IndexError):
+        return None
+    return tick, tuple(state)
+
+def counter_delta(new, old):
+    return (new - old) & 0xFF
+
+def seq_newer(new, old):
+    # uint16 sequence numbers, newer means ahead by less than half the range
+    return 0 < (new - old) & 0xFFFF < 0x8000
+
+class TickStats:
+    # Rolling numbers for one reporting window, reset after each report
+    def __init__(self, tick_rate):
+        self.budget = 1.0 / tick_rate
+        self.tick_rate = tick_rate
+        self.reset()
+
+    def reset(self):
+        self.ticks = 0
+        self.tick_time = 0.0
+        self.max_tick_time = 0.0
+        self.sim_time = 0.0
+        self.net_time = 0.0
+        self.bytes = 0
+        self.packets = 0
+        self.max_packet = 0
+        self.over_mtu = 0
+        self.too_big = 0
+        self.overruns = 0
+        self.players = 0
+        self.monkeys = 0
+        self.bullets = 0
+
+    def record(self, sim_time, net_time, sizes, sim):
+        # sizes only has packets that were sent, too_big is counted by the server
+        tick_time = sim_time + net_time
+        self.ticks += 1
+        self.tick_time += tick_time
+        self.max_tick_time = max(self.max_tick_time, tick_time)
+        self.sim_time += sim_time
+        self.net_time += net_time
+        self.bytes += sum(sizes)
+        self.packets += len(sizes)
+        if sizes:
+            self.max_packet = max(self.max_packet, max(sizes))
+            self.over_mtu += sum(1 for size in sizes if size > MTU)
+        if tick_time > self.budget:
+            self.overruns += 1
+        self.players = len(sim.players)
+        self.monkeys = len(sim.monkeys)
+        self.bullets = len(sim.bullets)
+
+    def summary(self):
+        ticks = max(1, self.ticks)
+        bytes_per_tick = self.bytes / ticks
+        return {
+            'ticks': self.ticks,
+            'players': self.players,
+            'monkeys': self.monkeys,
+            'bullets': self.bullets,
+            'tick_ms': self.tick_time / ticks * 1000,
+            'max_tick_ms': self.max_tick_time * 1000,
+            'sim_ms': self.sim_time / ticks * 1000,
+            'net_ms': self.net_time / ticks * 1000,
+            'load': self.tick_time / ticks / self.budget,
+            'overruns': self.overruns,
+            'bytes_per_tick': bytes_per_tick,
+            'bytes_per_client': bytes_per_tick / max(1, self.players),
+            'kbit_per_s': bytes_per_tick * self.tick_rate * 8 / 1000,
+            'max_packet': self.max_packet,
+            'over_mtu': self.over_mtu,
+            'too_big': self.too_big,
+        }
+
+    def report(self):
+        s = self.summary()
+        return (f"players {s['players']} monkeys {s['monkeys']} bullets {s['bullets']} | "
+                f"tick {s['tick_ms']:.2f}ms (max {s['max_tick_ms']:.2f}ms, "
+                f"{s['load']:.0%} of budget, {s['overruns']} over) "
+                f"sim {s['sim_ms']:.2f}ms net {s['net_ms']:.2f}ms | "
+                f"{s['bytes_per_tick']:.0f} B/tick {s['bytes_per_client']:.0f} B/client "
+                f"{s['kbit_per_s']:.1f} kbit/s max packet {s['max_packet']} B "
+                f"({s['over_mtu']} over {MTU} B MTU, {s['too_big']} too big to send)")
+
+class RemoteClient:
+    def __init__(self, addr, slot, now, seq):
+        self.addr = addr
+        self.slot = slot
+        self.last_seen = now
+        self.seq = seq
+        self.ack = 0
+        self.move = (0, 0)
+        self.angle = 0
+        self.fire = 0
+        self.reload = 0
+        self.start = 0
+
+class GameServer(asyncio.DatagramProtocol):
+    def __init__(self, tick_rate=TICK_RATE, report_interval=5.0):
+        self.tick_rate = tick_rate
+        self.report_interval = report_interval
+        self.sim = Simulation()
+        self.clients = {}
+        self.history = {}
+        self.tick = 0
+        self.stats = TickStats(tick_rate)
+        self.transport = None
+        self.running = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.handle(data, addr, time.monotonic())
+
+    def handle(self, data, addr, now):
+        if not data:
+            return
+        client = self.clients.get(addr)
+        msg = data[0]
+
+        if msg == MSG_JOIN and len(data) == JOIN.size:
+            _, seq = JOIN.unpack(data)
+            if client is None:
+                player = self.sim.add_player()
+                if player is None:
+                    self.transport.sendto(bytes([MSG_FULL]), addr)
+                    return
+                client = RemoteClient(addr, player.slot, now, seq)
+                self.clients[addr] = client
+                log.info('player %d joined from %s:%d', client.slot, *addr[:2])
+            else:
+                # The client reset itself, so it has no baselines and its
+                # press counters start from zero again.  Inputs it sent
+                # before this join are stale and dropped by the sequence.
+                client.seq = seq
+                client.ack = 0
+                client.fire = client.reload = client.start = 0
+                client.last_seen = now
+            self.transport.sendto(WELCOME.pack(MSG_WELCOME, client.slot, self.tick_rate), addr)
+        elif client is None:
+            # Timed out or the server restarted, tell the client to join again
+            if msg == MSG_INPUT:
+                self.transport.sendto(bytes([MSG_NOT_JOINED]), addr)
+        elif msg == MSG_INPUT and len(data) == INPUT.size:
+            _, seq, ack, move_x, move_y, angle, fire, reload, start = INPUT.unpack(data)
+            client.last_seen = now
+            if not seq_newer(seq, client.seq):
+                # Late or duplicated datagram, its presses were already counted
+                return
+            client.seq = seq
+            if ack > client.ack:
+                client.ack = ack
+            client.move = (move_x / 127, move_y / 127)
+            client.angle = angle / ANGLE_SCALE
+            player = self.sim.players.get(client.slot)
+            if player and player.alive:
+                player.angle = client.angle
+                # Presses are counters, so a lost packet never loses a shot
+                if counter_delta(fire, client.fire):
+                    self.sim.fire(player)
+                if counter_delta(reload, client.reload):
+                    player.reload()
+            if counter_delta(start, client.start) and not (self.sim.wave_active or self.sim.game_over):
+                self.sim.start_wave()
+            client.fire, client.reload, client.start = fire, reload, start
+        elif msg == MSG_LEAVE:
+            self.drop(client)
+
+    def drop(self, client):
+        log.info('player %d left', client.slot)
+        del self.clients[client.addr]
+        self.sim.remove_player(client.slot)
+        if not self.clients:
+            # Nobody left, the next group starts a fresh game
+            self.sim = Simulation()
+            self.history.clear()
+
+    def expire(self, now):
+        for client in list(self.clients.values()):
+            if now - client.last_seen > CLIENT_TIMEOUT:
+                self.drop(client)
+
+    def step(self, dt):
+        for client in self.clients.values():
+            player = self.sim.players.get(client.slot)
+            if player and player.alive and client.move != (0, 0):
+                dir_x, dir_y = client.move
+                length = math.sqrt(dir_x**2 + dir_y**2)
+                if length > 1:
+                    dir_x, dir_y = dir_x / length, dir_y / length
+                player.move(dir_x, dir_y, dt)
+        self.sim.update(dt)
+
+    def broadcast(self):
+        state = capture(self.sim)
+        self.history[self.tick] = state
+        self.history.pop(self.tick - HISTORY, None)
+
+        # Clients that acked the same tick get the same bytes
+        encoded = {}
+        sizes = []
+        for client in self.clients.values():
+            base_tick = client.ack if client.ack in self.history else 0
+            packet = encoded.get(base_tick)
+            if packet is None:
+                base = self.history[base_tick] if base_tick else EMPTY
+                packet = encode_snapshot(self.tick, base_tick, base, state)
+                encoded[base_tick] = packet
+            if len(packet) > MAX_DATAGRAM:
+                self.stats.too_big += 1
+                continue
+            self.transport.sendto(packet, client.addr)
+            sizes.append(len(packet))
+        return sizes
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        dt = 1.0 / self.tick_rate
+        next_tick = loop.time()
+        next_report = loop.time() + self.report_interval
+        self.running = True
+        while self.running:
+            self.update(dt, time.monotonic())
+
+            if self.report_interval and loop.time() >= next_report:
+                if self.stats.over_mtu or self.stats.too_big:
+                    log.warning('%d snapshots over %d B MTU, %d over the %d B UDP limit (max %d B)',
+                                self.stats.over_mtu, MTU, self.stats.too_big,
+                                MAX_DATAGRAM, self.stats.max_packet)
+                log.info('%s', self.stats.report())
+                self.stats.reset()
+                next_report += self.report_interval
+
+            next_tick += dt
+            delay = next_tick - loop.time()
+            if delay < 0:
+                # Too slow to keep up, drop the missed ticks instead of bursting
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    def update(self, dt, now):
+        self.tick += 1
+        started = time.perf_counter()
+        self.expire(now)
+        self.step(dt)
+        simulated = time.perf_counter()
+        sizes = self.broadcast()
+        finished = time.perf_counter()
+        self.stats.record(simulated - started, finished - simulated, sizes, self.sim)
+
+    def stop(self):
+        self.running = False
+
+async def serve(host, port, tick_rate=TICK_RATE, report_interval=5.0):
+    loop = asyncio.get_running_loop()
+    server = GameServer(tick_rate, report_interval)
+    transport, _ = await loop.create_datagram_endpoint(lambda: server, local_addr=(host, port))
+    log.info('serving on %s:%d at %d ticks/s', host, port, tick_rate)
+    try:
+        await server.run()
+    finally:
+        transport.close()
+
+class ClientWorld:
+    # Client side copy of the Simulation, rebuilt from snapshots.  Exposes
+    # the same attributes GameWidget draws from.
+    def __init__(self):
+        self.factories = (
+            None,
+            lambda values: Player(slot=values['slot']),
+            lambda values: Monkey(0, 0, 1, values['type']),
+            lambda values: Bullet(0, 0, 0),
+            lambda values: Powerup(0, 0, values['type']),
+        )
+        self.tick_rate = TICK_RATE
+        self.reset()
+
+    def reset(self):
+        self.states = {}
+        self.ticks = []
+        self.latest_tick = 0
+        self.latest_time = 0.0
+        self.render_tick = 0.0
+        self.objects = ({}, {}, {}, {}, {})
+
+        self.players = self.objects[1]
+        self.monkeys = []
+        self.bullets = []
+        self.powerups = []
+        self.wave = 1
+        self.wave_active = False
+        self.monkeys_to_spawn = 0
+        self.game_over = False
+
+    def receive(self, data, now):
+        decoded = decode_snapshot(data, self.states)
+        if decoded is None:
+            return False
+        tick, state = decoded
+        if tick in self.states:
+            return False
+        self.states[tick] = state
+        bisect.insort(self.ticks, tick)
+        while self.ticks[0] <= self.ticks[-1] - HISTORY:
+            del self.states[self.ticks.pop(0)]
+        if tick > self.latest_tick:
+            self.latest_tick = tick
+            self.latest_time = now
+        return True
+
+    def interpolate(self, now):
+        if not self.latest_tick:
+            return
+        target = self.latest_tick + (now - self.latest_time) * self.tick_rate - INTERP_TICKS
+        # Never go back in time when a snapshot arrives early
+        self.render_tick = max(self.render_tick, min(target, self.latest_tick))
+        index = bisect.bisect_right(self.ticks, self.render_tick)
+        older = self.ticks[max(0, index - 1)]
+        newer = self.ticks[min(index, len(self.ticks) - 1)]
+        if newer > older:
+            blend = (self.render_tick - older) / (newer - older)
+        else:
+            blend = 0.0
+        self.show(self.states[older], self.states[newer], max(0.0, min(1.0, blend)))
+
+    def show(self, older, newer, blend):
+        WORLD.apply(self, newer[0][0])
+        for kind in range(1, len(KINDS)):
+            schema = KINDS[kind]
+            objects = self.objects[kind]
+            for entity_id in list(objects):
+                if entity_id not in newer[kind]:
+                    del objects[entity_id]
+            for entity_id, values in newer[kind].items():
+                obj = objects.get(entity_id)
+                if obj is None:
+                    info = dict(zip((f.attr for f in schema.fields), schema.decode(values)))
+                    info['slot'] = entity_id
+                    obj = self.factories[kind](info)
+                    obj.id = entity_id
+                    objects[entity_id] = obj
+                schema.apply(obj, values)
+                old = older[kind].get(entity_id)
+                if old is not None and blend < 1.0:
+                    for f, a, b in zip(schema.fields, schema.decode(old), schema.decode(values)):
+                        if f.smooth == 'linear':
+                            setattr(obj, f.attr, a + (b - a) * blend)
+                        elif f.smooth == 'angle':
+                            turn = (b - a + math.pi) % (2 * math.pi) - math.pi
+                            setattr(obj, f.attr, a + turn * blend)
+        self.monkeys = list(self.objects[2].values())
+        self.bullets = list(self.objects[3].values())
+        self.powerups = list(self.objects[4].values())
+
+class ClientSession:
+    # Protocol state of one player, independent of how packets are moved
+    def __init__(self):
+        self.world = ClientWorld()
+        self.slot = None
+        self.full = False
+        self.last_join = None
+        self.last_snapshot = None
+        self.reconnecting = False
+        # Keeps counting across rejoins so the server can spot stale inputs
+        self.seq = 0
+        self.move = (0.0, 0.0)
+        self.angle = 0.0
+        self.fire = 0
+        self.reload = 0
+        self.start = 0
+
+    def reset(self):
+        # Start over as a new player, the server has forgotten us
+        self.world.reset()
+        self.slot = None
+        self.last_join = None
+        self.last_snapshot = None
+        self.reconnecting = True
+        self.fire = 0
+        self.reload = 0
+        self.start = 0
+
+    def handle(self, data, now):
+        if not data:
+            return
+        msg = data[0]
+        if msg == MSG_SNAPSHOT:
+            if self.slot is not None and self.world.receive(data, now):
+                self.last_snapshot = now
+        elif msg == MSG_WELCOME and len(data) == WELCOME.size:
+            if self.slot is None:
+                _, self.slot, self.world.tick_rate = WELCOME.unpack(data)
+                self.last_snapshot = now
+        elif msg == MSG_FULL:
+            self.full = True
+        elif msg == MSG_NOT_JOINED and self.slot is not None:
+            self.reset()
+
+    def wants_join(self, now):
+        if self.slot is not None and now - self.last_snapshot > CLIENT_TIMEOUT:
+            self.reset()
+        if self.slot is not None or self.full:
+            return False
+        if self.last_join is not None and now - self.last_join < JOIN_RETRY:
+            return False
+        self.last_join = now
+        return True
+
+    def join_packet(self):
+        return JOIN.pack(MSG_JOIN, self.seq)
+
+    def leave_packet(self):
+        return bytes([MSG_LEAVE])
+
+    def input_packet(self):
+        move_x = int(round(max(-1.0, min(1.0, self.move[0])) * 127))
+        move_y = int(round(max(-1.0, min(1.0, self.move[1])) * 127))
+        angle = int(round(self.angle % (2 * math.pi) * ANGLE_SCALE)) & 0xFFFF
+        self.seq = (self.seq + 1) & 0xFFFF
+        return INPUT.pack(MSG_INPUT, self.seq, self.world.latest_tick, move_x, move_y, angle,
+                          self.fire, self.reload, self.start)
+
+    def press_fire(self):
+        self.fire = (self.fire + 1) & 0xFF
+
+    def press_reload(self):
+        self.reload = (self.reload + 1) & 0xFF
+
+    def press_start(self):
+        self.start = (self.start + 1) & 0xFF
+
+class SocketClient(ClientSession):
+    # Non-blocking UDP socket, polled from the Kivy clock
+    def __init__(self, host, port):
+        super().__init__()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.sock.connect((host, port))
+
+    def poll(self, now):
+        while True:
+            try:
+                data = self.sock.recv(65535)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                # ICMP port unreachable while the server is not up yet
+                break
+            self.handle(data, now)
+        if self.wants_join(now):
+            self.send(self.join_packet())
+
+    def send(self, packet):
+        try:
+            self.sock.send(packet)
+        except OSError:
+            pass
+
+    def send_input(self):
+        if self.slot is not None:
+            self.send(self.input_packet())
+
+    def close(self):
+        if self.slot is not None:
+            self.send(self.leave_packet())
+        self.sock.close()
+
+class Bot(asyncio.DatagramProtocol):
+    # Headless player for load tests: wanders around and keeps shooting
+    def __init__(self, start_waves=True):
+        self.session = ClientSession()
+        self.start_waves = start_waves
+        self.transport = None
+        self.bytes = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.bytes += len(data)
+        self.session.handle(data, time.monotonic())
+
+    def error_received(self, exc):
+        pass
+
+    async def run(self, tick_rate=TICK_RATE):
+        session = self.session
+        ticks = 0
+        while True:
+            now = time.monotonic()
+            if session.wants_join(now):
+                self.transport.sendto(session.join_packet())
+            if session.slot is not None:
+                if ticks % tick_rate == 0:
+                    heading = random.uniform(0, 2 * math.pi)
+                    session.move = (math.cos(heading), math.sin(heading))
+                session.angle += 0.2
+                if ticks % 3 == 0:
+                    session.press_fire()
+                player = session.world.players.get(session.slot)
+                if player and player.ammo == 0:
+                    session.press_reload()
+                if self.start_waves and not session.world.wave_active:
+                    session.press_start()
+                session.world.interpolate(now)
+                self.transport.sendto(session.input_packet())
+            ticks += 1
+            await asyncio.sleep(1.0 / tick_rate)
+
+async def run_bots(host, port, players):
+    loop = asyncio.get_running_loop()
+    bots = []
+    for _ in range(players):
+        bot = Bot()
+        await loop.create_datagram_endpoint(lambda bot=bot: bot, remote_addr=(host, port))
+        bots.append(bot)
+    await asyncio.gather(*(bot.run() for bot in bots))
+
+class BenchServer(GameServer):
+    # Holds the monkey count steady and keeps the bots alive so every
+    # reporting window measures the same load
+    def __init__(self, monkeys, tick_rate=TICK_RATE):
+        super().__init__(tick_rate, report_interval=0)
+        self.monkeys = monkeys
+
+    def step(self, dt):
+        for player in self.sim.players.values():
+            player.health = player.max_health
+        while len(self.sim.monkeys) < self.monkeys:
+            self.sim.spawn_monkey()
+        self.sim.monkeys_to_spawn = 0
+        super().step(dt)
+
+async def bench(players, monkey_counts, seconds, tick_rate=TICK_RATE):
+    loop = asyncio.get_running_loop()
+    results = []
+    for monkeys in monkey_counts:
+        server = BenchServer(monkeys, tick_rate)
+        transport, _ = await loop.create_datagram_endpoint(lambda: server, local_addr=('127.0.0.1', 0))
+        port = transport.get_extra_info('sockname')[1]
+        tasks = [loop.create_task(server.run())]
+        bots = []
+        for _ in range(players):
+            bot = Bot(start_waves=False)
+            await loop.create_datagram_endpoint(lambda bot=bot: bot, remote_addr=('127.0.0.1', port))
+            bots.append(bot)
+            tasks.append(loop.create_task(bot.run(tick_rate)))
+
+        # Let everyone join and the deltas settle before measuring
+        await asyncio.sleep(1.0)
+        server.stats.reset()
+        for bot in bots:
+            bot.bytes = 0
+        await asyncio.sleep(seconds)
+        summary = server.stats.summary()
+        # What actually arrived, for comparison with what the server sent
+        received = sum(bot.bytes for bot in bots) / max(1, len(bots))
+        summary['client_kbit_per_s'] = received * 8 / 1000 / seconds
+        results.append(summary)
+        print(server.stats.report(), flush=True)
+        print(f"  each bot received {summary['client_kbit_per_s']:.1f} kbit/s", flush=True)
+
+        server.stop()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for bot in bots:
+            bot.transport.close()
+        transport.close()
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Zombie Monkeys co-op server')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    server_cmd = commands.add_parser('server', help='run the authoritative simulation')
+    server_cmd.add_argument('--host', default='0.0.0.0')
+    server_cmd.add_argument('--port', type=int, default=DEFAULT_PORT)
+    server_cmd.add_argument('--tick-rate', type=int, default=TICK_RATE)
+    server_cmd.add_argument('--report', type=float, default=5.0,
+                            help='seconds between stats lines, 0 to disable')
+
+    bots_cmd = commands.add_parser('bots', help='connect headless players to a server')
+    bots_cmd.add_argument('--host', default='127.0.0.1')
+    bots_cmd.add_argument('--port', type=int, default=DEFAULT_PORT)
+    bots_cmd.add_argument('--players', type=int, default=MAX_PLAYERS)
+
+    bench_cmd = commands.add_parser('bench', help='measure tick time and bandwidth on localhost')
+    bench_cmd.add_argument('--players', type=int, default=MAX_PLAYERS)
+    bench_cmd.add_argument('--monkeys', default='25,100,400',
+                           help='comma separated monkey counts to hold steady')
+    bench_cmd.add_argument('--seconds', type=float, default=5.0)
+    bench_cmd.add_argument('--tick-rate', type=int, default=TICK_RATE)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    try:
+        if args.command == 'server':
+            asyncio.run(serve(args.host, args.port, args.tick_rate, args.report))
+        elif args.command == 'bots':
+            asyncio.run(run_bots(args.host, args.port, args.players))
+        else:
+            counts = [int(n) for n in args.monkeys.split(',')]
+            asyncio.run(bench(args.players, counts, args.seconds, args.tick_rate))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
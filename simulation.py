@@ -0,0 +1,362 @@
+import random
+import math
+
+# World bounds shared by the local game and the headless server
+WORLD_WIDTH = 800
+WORLD_HEIGHT = 600
+MAX_PLAYERS = 4
+
+class Powerup:
+    def __init__(self, x, y, type):
+        self.id = 0
+        self.x = x
+        self.y = y
+        self.type = type  # 'health', 'ammo', 'speed', 'damage'
+        self.alive = True
+        self.lifetime = 15.0
+
+    def update(self, dt):
+        self.lifetime -= dt
+        if self.lifetime <= 0:
+            self.alive = False
+
+class Bullet:
+    def __init__(self, x, y, angle, damage=10, owner=0):
+        self.id = 0
+        self.x = x
+        self.y = y
+        self.angle = angle
+        self.speed = 500
+        self.damage = damage
+        self.owner = owner
+        self.alive = True
+
+    def update(self, dt):
+        self.x += math.cos(self.angle) * self.speed * dt
+        self.y += math.sin(self.angle) * self.speed * dt
+
+        if self.x < 0 or self.x > WORLD_WIDTH or self.y < 0 or self.y > WORLD_HEIGHT:
+            self.alive = False
+
+class Monkey:
+    def __init__(self, spawn_x, spawn_y, wave_num, monkey_type='normal'):
+        self.id = 0
+        self.x = spawn_x
+        self.y = spawn_y
+        self.type = monkey_type
+
+        # Different monkey types
+        if monkey_type == 'fast':
+            self.health = 20 + (wave_num * 5)
+            self.speed = 100 + (wave_num * 8)
+            self.damage = 3 + wave_num
+            self.size = 15
+            self.color = (0.8, 0.3, 0.3)
+        elif monkey_type == 'tank':
+            self.health = 60 + (wave_num * 20)
+            self.speed = 30 + (wave_num * 2)
+            self.damage = 10 + (wave_num * 2)
+            self.size = 30
+            self.color = (0.2, 0.6, 0.2)
+        else:  # normal
+            self.health = 30 + (wave_num * 10)
+            self.speed = 50 + (wave_num * 5)
+            self.damage = 5 + wave_num
+            self.size = 20
+            self.color = (0.3, 0.5, 0.2)
+
+        self.max_health = self.health
+        self.alive = True
+        self.attack_cooldown = 0
+        self.animation_frame = 0
+
+    def move_towards_player(self, player_x, player_y, dt):
+        dx = player_x - self.x
+        dy = player_y - self.y
+        dist = math.sqrt(dx*dx + dy*dy)
+
+        if dist > 35:
+            self.x += (dx / dist) * self.speed * dt
+            self.y += (dy / dist) * self.speed * dt
+        elif self.attack_cooldown <= 0:
+            self.attack_cooldown = 1.0
+            return True
+
+        self.attack_cooldown -= dt
+        self.animation_frame = (self.animation_frame + dt * 10) % 4
+        return False
+
+    def take_damage(self, damage):
+        self.health -= damage
+        if self.health <= 0:
+            self.alive = False
+            return True
+        return False
+
+class Player:
+    def __init__(self, x=400, y=300, slot=0):
+        self.slot = slot
+        self.x = x
+        self.y = y
+        self.health = 100
+        self.max_health = 100
+        self.alive = True
+        self.speed = 180
+        self.angle = 0
+        self.points = 0
+        self.kills = 0
+        self.ammo = 30
+        self.max_ammo = 30
+        self.reload_time = 0
+        self.fire_cooldown = 0
+        self.damage = 10
+        self.speed_boost = 1.0
+        self.speed_boost_time = 0
+        self.damage_boost = 1.0
+        self.damage_boost_time = 0
+
+    def shoot(self):
+        if self.ammo > 0 and self.fire_cooldown <= 0:
+            self.ammo -= 1
+            self.fire_cooldown = 0.15
+            return Bullet(self.x, self.y, self.angle, self.damage * self.damage_boost, self.slot)
+        return None
+
+    def reload(self):
+        if self.reload_time <= 0 and self.ammo < self.max_ammo:
+            self.reload_time = 2.0
+
+    def move(self, dir_x, dir_y, dt):
+        self.x += dir_x * self.speed * self.speed_boost * dt
+        self.y += dir_y * self.speed * self.speed_boost * dt
+
+        self.x = max(20, min(WORLD_WIDTH - 20, self.x))
+        self.y = max(20, min(WORLD_HEIGHT - 20, self.y))
+
+    def take_damage(self, damage):
+        self.health -= damage
+        if self.health <= 0:
+            self.health = 0
+            self.alive = False
+            return True
+        return False
+
+    def pickup_powerup(self, powerup):
+        if powerup.type == 'health':
+            self.health = min(self.max_health, self.health + 30)
+        elif powerup.type == 'ammo':
+            self.ammo = self.max_ammo
+        elif powerup.type == 'speed':
+            self.speed_boost = 1.5
+            self.speed_boost_time = 10.0
+        elif powerup.type == 'damage':
+            self.damage_boost = 2.0
+            self.damage_boost_time = 10.0
+
+    def update(self, dt):
+        if self.reload_time > 0:
+            self.reload_time -= dt
+            if self.reload_time <= 0:
+                self.ammo = self.max_ammo
+
+        if self.fire_cooldown > 0:
+            self.fire_cooldown -= dt
+
+        if self.speed_boost_time > 0:
+            self.speed_boost_time -= dt
+            if self.speed_boost_time <= 0:
+                self.speed_boost = 1.0
+
+        if self.damage_boost_time > 0:
+            self.damage_boost_time -= dt
+            if self.damage_boost_time <= 0:
+                self.damage_boost = 1.0
+
+class Simulation:
+    # Game rules without any rendering, so the same code runs inside the
+    # Kivy widget and in the headless co-op server (see netplay.py).
+    SPAWN_POINTS = [(400, 300), (360, 260), (440, 340), (360, 340)]
+
+    def __init__(self):
+        self.players = {}
+        self.last_id = 0
+        self.restart()
+
+    def restart(self):
+        # New game from wave 1, everyone already here starts over
+        slots = list(self.players)
+        self.players = {}
+        self.monkeys = []
+        self.bullets = []
+        self.powerups = []
+        self.wave = 1
+        self.wave_active = False
+        self.monkeys_to_spawn = 0
+        self.spawn_timer = 0
+        self.game_over = False
+        self.powerup_spawn_timer = 0
+        for slot in slots:
+            self.add_player(slot)
+
+    def next_id(self):
+        # Entity ids are sent as uint16 over the network, 0 is never used
+        self.last_id = self.last_id % 65535 + 1
+        return self.last_id
+
+    def add_player(self, slot=None):
+        if slot is None:
+            free = [s for s in range(MAX_PLAYERS) if s not in self.players]
+            if not free:
+                return None
+            slot = free[0]
+        if self.game_over:
+            # Joining a finished game starts a new one instead of a game over screen
+            self.restart()
+        x, y = self.SPAWN_POINTS[slot % len(self.SPAWN_POINTS)]
+        player = Player(x, y, slot)
+        self.players[slot] = player
+        return player
+
+    def remove_player(self, slot):
+        self.players.pop(slot, None)
+
+    def start_wave(self):
+        self.wave_active = True
+        self.monkeys_to_spawn = 5 + (self.wave * 4)
+
+        # Add special monkeys in later waves
+        if self.wave >= 3:
+            self.monkeys_to_spawn += 2  # Add fast monkeys
+        if self.wave >= 5:
+            self.monkeys_to_spawn += 1  # Add tank monkeys
+
+        self.spawn_timer = 0
+
+    def spawn_monkey(self):
+        side = random.randint(0, 3)
+        if side == 0:
+            x, y = random.randint(0, WORLD_WIDTH), WORLD_HEIGHT
+        elif side == 1:
+            x, y = random.randint(0, WORLD_WIDTH), 0
+        elif side == 2:
+            x, y = 0, random.randint(0, WORLD_HEIGHT)
+        else:
+            x, y = WORLD_WIDTH, random.randint(0, WORLD_HEIGHT)
+
+        # Spawn special monkeys based on wave
+        monkey_type = 'normal'
+        if self.wave >= 5 and random.random() < 0.15:
+            monkey_type = 'tank'
+        elif self.wave >= 3 and random.random() < 0.25:
+            monkey_type = 'fast'
+
+        monkey = Monkey(x, y, self.wave, monkey_type)
+        monkey.id = self.next_id()
+        self.monkeys.append(monkey)
+        self.monkeys_to_spawn -= 1
+
+    def spawn_powerup(self):
+        x = random.randint(100, 700)
+        y = random.randint(100, 500)
+        powerup_type = random.choice(['health', 'ammo', 'speed', 'damage'])
+        powerup = Powerup(x, y, powerup_type)
+        powerup.id = self.next_id()
+        self.powerups.append(powerup)
+
+    def fire(self, player):
+        if not player.alive:
+            return None
+        bullet = player.shoot()
+        if bullet:
+            bullet.id = self.next_id()
+            self.bullets.append(bullet)
+        return bullet
+
+    def nearest_player(self, x, y):
+        nearest = None
+        nearest_dist = 0
+        for player in self.players.values():
+            if not player.alive:
+                continue
+            dist = (player.x - x)**2 + (player.y - y)**2
+            if nearest is None or dist < nearest_dist:
+                nearest = player
+                nearest_dist = dist
+        return nearest
+
+    def update(self, dt):
+        if self.game_over:
+            return
+
+        for player in self.players.values():
+            player.update(dt)
+
+        # Powerup spawning
+        self.powerup_spawn_timer += dt
+        if self.powerup_spawn_timer > 15.0 and len(self.powerups) < 3:
+            self.spawn_powerup()
+            self.powerup_spawn_timer = 0
+
+        # Update powerups
+        for powerup in self.powerups[:]:
+            powerup.update(dt)
+            if not powerup.alive:
+                self.powerups.remove(powerup)
+                continue
+            # Check pickup
+            for player in self.players.values():
+                if not player.alive:
+                    continue
+                dist = math.sqrt((powerup.x - player.x)**2 + (powerup.y - player.y)**2)
+                if dist < 25:
+                    player.pickup_powerup(powerup)
+                    self.powerups.remove(powerup)
+                    break
+
+        # Wave spawning
+        if self.wave_active and self.monkeys_to_spawn > 0:
+            self.spawn_timer += dt
+            spawn_rate = max(0.5, 1.5 - (self.wave * 0.1))
+            if self.spawn_timer > spawn_rate:
+                self.spawn_monkey()
+                self.spawn_timer = 0
+
+        # Check wave complete, downed players get back up with the wave bonus
+        if self.wave_active and self.monkeys_to_spawn == 0 and len(self.monkeys) == 0:
+            self.wave_active = False
+            self.wave += 1
+            for player in self.players.values():
+                player.points += 200 * self.wave
+                player.health = min(player.max_health, player.health + 20)
+                player.alive = True
+
+        # Update monkeys, each one chases the closest living player
+        for monkey in self.monkeys[:]:
+            target = self.nearest_player(monkey.x, monkey.y)
+            if target is None:
+                break
+            if monkey.move_towards_player(target.x, target.y, dt):
+                target.take_damage(monkey.damage)
+
+        if self.players and not any(p.alive for p in self.players.values()):
+            self.game_over = True
+
+        # Update bullets
+        for bullet in self.bullets[:]:
+            bullet.update(dt)
+            if not bullet.alive:
+                self.bullets.remove(bullet)
+                continue
+
+            for monkey in self.monkeys[:]:
+                dist = math.sqrt((bullet.x - monkey.x)**2 + (bullet.y - monkey.y)**2)
+                if dist < monkey.size:
+                    if monkey.take_damage(bullet.damage):
+                        points = 10 if monkey.type == 'normal' else 20 if monkey.type == 'fast' else 30
+                        shooter = self.players.get(bullet.owner)
+                        if shooter:
+                            shooter.points += points * self.wave
+                            shooter.kills += 1
+                        self.monkeys.remove(monkey)
+                    bullet.alive = False
+                    break
@@ -0,0 +1,253 @@
+import random
+
+import netplay
+from netplay import ClientSession, GameServer
+from simulation import Simulation
+
+DT = 1.0 / netplay.TICK_RATE
+
+class FakeTransport:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr=None):
+        self.sent.append((data, addr))
+
+def make_server():
+    server = GameServer(report_interval=0)
+    server.connection_made(FakeTransport())
+    return server
+
+def deliver(server, sessions, now, loss=0.0, rng=random):
+    for data, addr in server.transport.sent:
+        if rng.random() >= loss:
+            sessions[addr].handle(data, now)
+    server.transport.sent.clear()
+
+def join(server, sessions, now):
+    for addr, session in sessions.items():
+        if session.wants_join(now):
+            server.handle(session.join_packet(), addr, now)
+    deliver(server, sessions, now)
+
+def busy_sim():
+    random.seed(7)
+    sim = Simulation()
+    for _ in range(3):
+        sim.add_player()
+    sim.wave = 5
+    for _ in range(30):
+        sim.spawn_monkey()
+    sim.spawn_powerup()
+    sim.spawn_powerup()
+    for player in sim.players.values():
+        sim.fire(player)
+    return sim
+
+def test_full_snapshot_round_trip():
+    sim = busy_sim()
+    state = netplay.capture(sim)
+    packet = netplay.encode_snapshot(1, 0, netplay.EMPTY, state)
+    assert netplay.decode_snapshot(packet, {}) == (1, state)
+
+def test_delta_round_trip():
+    sim = busy_sim()
+    base = netplay.capture(sim)
+    full = netplay.encode_snapshot(1, 0, netplay.EMPTY, base)
+    for _ in range(5):
+        for player in sim.players.values():
+            player.angle += 0.3
+            player.fire_cooldown = 0
+            sim.fire(player)
+        sim.update(DT)
+    state = netplay.capture(sim)
+    delta = netplay.encode_snapshot(6, 1, base, state)
+    assert netplay.decode_snapshot(delta, {1: base}) == (6, state)
+    assert len(delta) < len(full)
+
+def test_unknown_baseline_is_dropped():
+    sim = busy_sim()
+    base = netplay.capture(sim)
+    sim.update(DT)
+    delta = netplay.encode_snapshot(2, 1, base, netplay.capture(sim))
+    assert netplay.decode_snapshot(delta, {}) is None
+
+def test_corrupt_snapshot_is_dropped():
+    sim = busy_sim()
+    packet = netplay.encode_snapshot(1, 0, netplay.EMPTY, netplay.capture(sim))
+    for size in range(len(packet)):
+        assert netplay.decode_snapshot(packet[:size], {}) is None
+
+    # An out of range monkey type
+    sim = Simulation()
+    sim.spawn_monkey()
+    state = netplay.capture(sim)
+    monkey_id, values = next(iter(state[2].items()))
+    state[2][monkey_id] = (9,) + values[1:]
+    packet = netplay.encode_snapshot(1, 0, netplay.EMPTY, state)
+    assert netplay.decode_snapshot(packet, {}) is None
+    assert not netplay.ClientWorld().receive(packet, 0.0)
+
+def test_lossy_link_recovers_lost_baselines():
+    rng = random.Random(3)
+    random.seed(3)
+    server = make_server()
+    sessions = {('127.0.0.1', 5000 + i): ClientSession() for i in range(3)}
+    now = 0.0
+    while any(s.slot is None for s in sessions.values()):
+        now += DT
+        join(server, sessions, now)
+
+    checked = 0
+    mismatches = 0
+    for tick in range(600):
+        now += DT
+        for addr, session in sessions.items():
+            session.move = (rng.uniform(-1, 1), rng.uniform(-1, 1))
+            session.angle += 0.1
+            session.press_fire()
+            if tick % 90 == 0:
+                session.press_start()
+            if rng.random() >= 0.3:
+                server.handle(session.input_packet(), addr, now)
+        server.update(DT, now)
+        deliver(server, sessions, now, loss=0.3, rng=rng)
+        for session in sessions.values():
+            world = session.world
+            if world.latest_tick == server.tick:
+                checked += 1
+                if world.states[world.latest_tick] != server.history[server.tick]:
+                    mismatches += 1
+
+    assert len(server.clients) == 3
+    assert checked > 600
+    assert mismatches == 0
+
+def test_press_counters_wrap():
+    server = make_server()
+    addr = ('127.0.0.1', 5000)
+    session = ClientSession()
+    join(server, {addr: session}, 0.0)
+    player = server.sim.players[session.slot]
+
+    session.fire = 255
+    server.handle(session.input_packet(), addr, 0.0)
+    player.fire_cooldown = 0
+    bullets = len(server.sim.bullets)
+
+    session.press_fire()
+    assert session.fire == 0
+    server.handle(session.input_packet(), addr, 0.0)
+    assert len(server.sim.bullets) == bullets + 1
+
+def test_join_when_full():
+    server = make_server()
+    sessions = {('127.0.0.1', 5000 + i): ClientSession() for i in range(netplay.MAX_PLAYERS + 1)}
+    join(server, sessions, 0.0)
+    slots = [s.slot for s in sessions.values()]
+    assert sorted(slots[:-1]) == list(range(netplay.MAX_PLAYERS))
+    last = list(sessions.values())[-1]
+    assert last.slot is None and last.full
+    assert not last.wants_join(1.0)
+
+def test_server_timeout_then_rejoin():
+    server = make_server()
+    addr = ('127.0.0.1', 5000)
+    session = ClientSession()
+    sessions = {addr: session}
+    join(server, sessions, 0.0)
+    server.update(DT, 0.0)
+    deliver(server, sessions, 0.0)
+
+    now = netplay.CLIENT_TIMEOUT + 1
+    server.expire(now)
+    assert not server.clients
+
+    server.handle(session.input_packet(), addr, now)
+    deliver(server, sessions, now)
+    assert session.slot is None and session.reconnecting
+    assert not session.world.players
+
+    join(server, sessions, now)
+    assert session.slot is not None
+    server.update(DT, now)
+    deliver(server, sessions, now)
+    assert session.world.latest_tick == server.tick
+    assert session.slot in session.world.states[server.tick][1]
+
+def test_client_timeout_then_rejoin():
+    server = make_server()
+    addr = ('127.0.0.1', 5000)
+    session = ClientSession()
+    sessions = {addr: session}
+    join(server, sessions, 0.0)
+    for _ in range(3):
+        server.handle(session.input_packet(), addr, 0.0)
+        server.update(DT, 0.0)
+        deliver(server, sessions, 0.0)
+    assert session.world.latest_tick == server.tick
+
+    # Snapshots stop arriving while the server still knows the client
+    now = netplay.CLIENT_TIMEOUT + 1
+    assert session.wants_join(now)
+    assert session.slot is None and session.reconnecting
+    server.handle(session.join_packet(), addr, now)
+    deliver(server, sessions, now)
+
+    # The server must not delta against ticks the client threw away
+    server.handle(session.input_packet(), addr, now)
+    server.update(DT, now)
+    deliver(server, sessions, now)
+    assert session.world.latest_tick == server.tick
+
+def test_reordered_and_duplicated_inputs_are_dropped():
+    server = make_server()
+    addr = ('127.0.0.1', 5000)
+    session = ClientSession()
+    join(server, {addr: session}, 0.0)
+    player = server.sim.players[session.slot]
+
+    session.press_fire()
+    first = session.input_packet()
+    session.press_fire()
+    session.move = (1, 0)
+    second = session.input_packet()
+
+    for packet in (first, second, first, second, first):
+        player.fire_cooldown = 0
+        server.handle(packet, addr, 0.0)
+    assert len(server.sim.bullets) == 2
+    assert server.clients[addr].move == (1, 0)
+
+    # A late packet from before the wave ended must not start the next one
+    session.press_start()
+    late = session.input_packet()
+    server.handle(session.input_packet(), addr, 0.0)
+    assert server.sim.wave_active
+    server.sim.wave_active = False
+    server.handle(late, addr, 0.0)
+    assert not server.sim.wave_active
+
+def test_stale_ack_after_rejoin_is_ignored():
+    server = make_server()
+    addr = ('127.0.0.1', 5000)
+    session = ClientSession()
+    sessions = {addr: session}
+    join(server, sessions, 0.0)
+    for _ in range(3):
+        server.handle(session.input_packet(), addr, 0.0)
+        server.update(DT, 0.0)
+        deliver(server, sessions, 0.0)
+    in_flight = session.input_packet()
+
+    now = netplay.CLIENT_TIMEOUT + 1
+    assert session.wants_join(now)
+    server.handle(session.join_packet(), addr, now)
+    deliver(server, sessions, now)
+
+    # The old input arrives after the rejoin and still acks a known tick
+    server.handle(in_flight, addr, now)
+    assert server.clients[addr].ack == 0
+    server.update(DT, now)
+    deliver(server, sessions, now)
+    assert session.world.latest_tick == server.tick
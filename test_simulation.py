@@ -0,0 +1,101 @@
+from simulation import Simulation, Monkey, Bullet, MAX_PLAYERS
+
+DT = 1.0 / 30
+
+def place_monkey(sim, x, y, health=None, damage=None):
+    monkey = Monkey(x, y, sim.wave)
+    monkey.id = sim.next_id()
+    if health is not None:
+        monkey.health = health
+    if damage is not None:
+        monkey.damage = damage
+    sim.monkeys.append(monkey)
+    return monkey
+
+def two_players():
+    sim = Simulation()
+    first = sim.add_player()
+    second = sim.add_player()
+    first.x, first.y = 100, 300
+    second.x, second.y = 700, 300
+    return sim, first, second
+
+def test_monkeys_chase_the_nearest_living_player():
+    sim, first, second = two_players()
+    monkey = place_monkey(sim, 300, 300)
+    sim.update(DT)
+    assert monkey.x < 300
+
+    first.take_damage(first.health)
+    monkey = place_monkey(sim, 300, 300)
+    sim.update(DT)
+    assert monkey.x > 300
+
+def test_kills_go_to_the_bullet_owner():
+    sim, first, second = two_players()
+    monkey = place_monkey(sim, 400, 100, health=1)
+    bullet = Bullet(monkey.x, monkey.y, 0, owner=second.slot)
+    bullet.speed = 0
+    sim.bullets.append(bullet)
+    sim.update(DT)
+    assert monkey not in sim.monkeys
+    assert (second.kills, second.points) == (1, 10)
+    assert (first.kills, first.points) == (0, 0)
+
+def test_game_is_over_only_when_every_player_is_down():
+    sim, first, second = two_players()
+    place_monkey(sim, first.x + 10, first.y, damage=1000)
+    sim.update(DT)
+    assert not first.alive and first.health == 0
+    assert second.alive
+    assert not sim.game_over
+
+    place_monkey(sim, second.x + 10, second.y, damage=1000)
+    sim.update(DT)
+    assert not second.alive
+    assert sim.game_over
+
+def test_single_player_death_ends_the_game():
+    sim = Simulation()
+    player = sim.add_player()
+    place_monkey(sim, player.x + 10, player.y, damage=1000)
+    sim.update(DT)
+    assert sim.game_over
+
+def test_downed_players_come_back_at_wave_end():
+    sim, first, second = two_players()
+    first.take_damage(first.health)
+    sim.wave_active = True
+    sim.monkeys_to_spawn = 0
+    sim.update(DT)
+    assert sim.wave == 2 and not sim.wave_active
+    assert first.alive and first.health == 20
+    assert second.health == second.max_health
+
+def test_joining_a_finished_game_starts_a_new_one():
+    sim, first, second = two_players()
+    sim.wave = 4
+    place_monkey(sim, 400, 300)
+    for player in (first, second):
+        player.take_damage(player.health)
+    sim.update(DT)
+    assert sim.game_over
+
+    third = sim.add_player()
+    assert not sim.game_over
+    assert sim.wave == 1 and not sim.monkeys
+    assert sorted(sim.players) == [0, 1, 2]
+    assert all(p.alive and p.health == p.max_health for p in sim.players.values())
+    assert sim.players[third.slot] is third
+
+def test_full_finished_game_is_left_alone():
+    sim = Simulation()
+    for _ in range(MAX_PLAYERS):
+        sim.add_player()
+    for player in sim.players.values():
+        player.take_damage(player.health)
+    sim.update(DT)
+    assert sim.game_over
+
+    assert sim.add_player() is None
+    assert sim.game_over